@@ -0,0 +1,238 @@
+from tls_client import update_lib
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+
+class FindAssetTester(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(update_lib, "CURRENT_DEPENDENCY_FILENAME", "tls-client-linux-arm64.so")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def release(self, tag_name, names):
+        return {
+            "tag_name": tag_name,
+            "assets": [{"name": name, "browser_download_url": f"https://example.com/{name}"} for name in names]
+        }
+
+    def test_exact_name(self):
+        release = self.release("v1.7.10", [
+            "tls-client-linux-arm64-1.7.10.h",
+            "tls-client-linux-arm64-1.7.9.so",
+            "tls-client-linux-arm64-1.7.10.so",
+            "tls-client-linux-armv7-1.7.10.so",
+        ])
+
+        self.assertEqual(update_lib.find_asset(release)["name"], "tls-client-linux-arm64-1.7.10.so")
+
+    def test_fallback(self):
+        release = self.release("v1.7.10", [
+            "tls-client-linux-arm64-1.7.10.h",
+            "tls-client-linux-arm64-1.7.10-rc1.so",
+            "tls-client-linux-armv7-1.7.10.so",
+        ])
+
+        self.assertEqual(update_lib.find_asset(release)["name"], "tls-client-linux-arm64-1.7.10-rc1.so")
+
+    def test_no_match(self):
+        release = self.release("v1.7.10", [
+            "tls-client-linux-arm64-1.7.10.h",
+            "tls-client-linux-armv7-1.7.10.so",
+        ])
+
+        self.assertIsNone(update_lib.find_asset(release))
+
+
+class VersionFileTester(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.version_file = os.path.join(directory.name, "version.txt")
+        patcher = mock.patch.object(update_lib, "LOCAL_VERSION_FILE", self.version_file)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        update_lib._LOCAL_VERSION_CACHE = None
+        self.addCleanup(setattr, update_lib, "_LOCAL_VERSION_CACHE", None)
+
+    def test_parse_json(self):
+        content = json.dumps({"version": "v1.7.10", "last_modified": "lm", "last_check": "ts", "etag": "\"etag\""})
+
+        self.assertEqual(
+            update_lib.parse_version_json(content),
+            {"version": "v1.7.10", "last_modified": "lm", "last_check": "ts", "etag": "\"etag\""}
+        )
+
+    def test_parse_json_without_caching_headers(self):
+        content = json.dumps({"version": "v1.7.10", "last_modified": None, "last_check": "ts"})
+
+        self.assertEqual(
+            update_lib.parse_version_json(content),
+            {"version": "v1.7.10", "last_modified": "", "last_check": "ts", "etag": ""}
+        )
+
+    def test_parse_json_invalid(self):
+        self.assertIsNone(update_lib.parse_version_json(""))
+        self.assertIsNone(update_lib.parse_version_json("{\"version\": "))
+        self.assertIsNone(update_lib.parse_version_json("[]"))
+        self.assertIsNone(update_lib.parse_version_json(json.dumps({"version": "v1.7.10"})))
+
+    def test_parse_legacy_three_lines(self):
+        self.assertEqual(
+            update_lib.parse_legacy_version("v1.7.10\nlm\nts"),
+            {"version": "v1.7.10", "last_modified": "lm", "last_check": "ts", "etag": ""}
+        )
+
+    def test_parse_legacy_four_lines(self):
+        self.assertEqual(
+            update_lib.parse_legacy_version("v1.7.10\nlm\nts\n\"etag\"\n"),
+            {"version": "v1.7.10", "last_modified": "lm", "last_check": "ts", "etag": "\"etag\""}
+        )
+
+    def test_parse_legacy_invalid(self):
+        self.assertIsNone(update_lib.parse_legacy_version(""))
+        self.assertIsNone(update_lib.parse_legacy_version("v1.7.10\nlm"))
+
+    def test_read_missing_file(self):
+        self.assertIsNone(update_lib.read_local_version())
+
+    def test_read_legacy_file(self):
+        with open(self.version_file, "w") as f:
+            f.write("v1.7.10\nlm\nts\n")
+
+        self.assertEqual(
+            update_lib.read_local_version(),
+            {"version": "v1.7.10", "last_modified": "lm", "last_check": "ts", "etag": ""}
+        )
+
+    def test_read_corrupt_file(self):
+        with open(self.version_file, "w") as f:
+            f.write("{\"version\": ")
+
+        self.assertIsNone(update_lib.read_local_version())
+
+    def test_save_and_read(self):
+        update_lib.save_local_version("v1.7.9", "lm", "\"etag\"")
+        local_version_info = update_lib.read_local_version()
+
+        self.assertEqual(local_version_info["version"], "v1.7.9")
+        self.assertEqual(local_version_info["last_modified"], "lm")
+        self.assertEqual(local_version_info["etag"], "\"etag\"")
+        self.assertFalse(os.path.exists(self.version_file + ".tmp"))
+
+        update_lib.save_local_version("v1.7.10", None, None)
+        local_version_info = update_lib.read_local_version()
+
+        self.assertEqual(local_version_info["version"], "v1.7.10")
+        self.assertEqual(local_version_info["last_modified"], "")
+        self.assertEqual(local_version_info["etag"], "")
+
+    def test_read_after_external_write(self):
+        update_lib.save_local_version("v1.7.9", "lm", "\"etag\"")
+        self.assertEqual(update_lib.read_local_version()["version"], "v1.7.9")
+
+        with open(self.version_file, "w") as f:
+            f.write("v1.7.10\nlm\nts\n")
+        mtime = os.stat(self.version_file).st_mtime_ns + 1_000_000_000
+        os.utime(self.version_file, ns=(mtime, mtime))  # Make sure the modification time changed on coarse filesystems.
+
+        self.assertEqual(update_lib.read_local_version()["version"], "v1.7.10")
+
+
+class FakeResponse(io.BytesIO):
+    headers = {}
+
+
+class FakeOpener:
+    def __init__(self, release, library):
+        self.release = release
+        self.library = library
+
+    def open(self, request, timeout=None):
+        if isinstance(request, str):
+            return FakeResponse(self.library)
+        return FakeResponse(json.dumps(self.release).encode())
+
+
+class UpdateLibAsyncTester(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.version_file = os.path.join(directory.name, "version.txt")
+        self.library_file = os.path.join(directory.name, "tls-client-linux-arm64.so")
+        for name, value in [
+            ("CURRENT_DEPENDENCY_FILENAME", "tls-client-linux-arm64.so"),
+            ("DOWNLOAD_DIR", directory.name),
+            ("LOCAL_VERSION_FILE", self.version_file),
+            ("LOCK_FILE", self.version_file + ".lock"),
+            ("LOCAL_LIBRARY_FILE", self.library_file),
+        ]:
+            patcher = mock.patch.object(update_lib, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        update_lib._LOCAL_VERSION_CACHE = None
+        self.addCleanup(setattr, update_lib, "_LOCAL_VERSION_CACHE", None)
+
+        with open(self.library_file, "wb") as f:
+            f.write(b"old library")
+        os.utime(self.library_file, (0, 0))  # Make the library old enough to be checked.
+        update_lib.save_local_version("v1.7.9", None, None)
+        with open(self.version_file, "r") as f:
+            local_version_info = json.load(f)
+        local_version_info["last_check"] = "2000-01-01T00:00:00+00:00"
+        with open(self.version_file, "w") as f:
+            json.dump(local_version_info, f)
+
+        release = {
+            "tag_name": "v1.7.10",
+            "assets": [{"name": "tls-client-linux-arm64-1.7.10.so", "browser_download_url": "https://example.com/lib"}]
+        }
+        patcher = mock.patch.object(update_lib, "get_opener", return_value=FakeOpener(release, b"new library"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_update_in_background(self):
+        with mock.patch.object(update_lib, "UPDATE_IN_BACKGROUND", True), \
+                mock.patch.object(update_lib.threading, "Thread") as thread:
+            update_lib.update_lib_async()
+
+        thread.assert_called_once_with(target=update_lib.try_update_lib, daemon=True)
+        with open(self.library_file, "rb") as f:
+            self.assertEqual(f.read(), b"old library")
+
+    def test_update_before_loading(self):
+        with mock.patch.object(update_lib, "UPDATE_IN_BACKGROUND", False), \
+                mock.patch.object(update_lib.threading, "Thread") as thread, \
+                mock.patch("builtins.print"):
+            update_lib.update_lib_async()
+
+        thread.assert_not_called()
+        with open(self.library_file, "rb") as f:
+            self.assertEqual(f.read(), b"new library")
+        self.assertEqual(update_lib.read_local_version()["version"], "v1.7.10")
+
+    def test_library_in_use(self):
+        replace = os.replace
+
+        def replace_unless_library(src, dst):
+            if dst == self.library_file:
+                raise PermissionError(13, "The process cannot access the file because it is being used by another process")
+            replace(src, dst)
+
+        with mock.patch.object(update_lib, "UPDATE_IN_BACKGROUND", False), \
+                mock.patch.object(update_lib.os, "replace", side_effect=replace_unless_library), \
+                mock.patch("builtins.print"), \
+                self.assertWarns(RuntimeWarning):
+            update_lib.update_lib_async()
+
+        with open(self.library_file, "rb") as f:
+            self.assertEqual(f.read(), b"old library")
+        self.assertFalse(os.path.exists(self.library_file + ".tmp"))
+        self.assertEqual(update_lib.read_local_version()["version"], "v1.7.9")
+
+
+if __name__ == "__main__":
+    unittest.main()
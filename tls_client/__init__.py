@@ -11,8 +11,8 @@
 # Links:
 # tls-client: https://github.com/bogdanfinn/tls-client
 # requests: https://github.com/psf/requests
-from .update_lib import update_lib
+from .update_lib import update_lib_async
 
-update_lib()
+update_lib_async()
 
 from .sessions import Session
@@ -1,52 +1,80 @@
 import ctypes
+import json
 import os
+from typing import Any, Callable
 
 from .utils import get_dependency_filename
 
+try:
+    import orjson  # Optional, parses and serialises JSON several times faster than the json module.
+except ImportError:
+    orjson = None
+
 # Get the absolute path to the directory containing this file.
 root_dir = os.path.abspath(os.path.dirname(__file__))
 
 # Construct the full path to the dependency library file.
 # get_dependency_filename() is assumed to return a platform-specific filename (e.g., libclient.so, client.dll).
-library_path = f'{root_dir}/dependencies/{get_dependency_filename()}'
+library_path = os.path.join(root_dir, 'dependencies', get_dependency_filename())
 
-# Load the shared library.  ctypes.cdll.LoadLibrary loads the shared library at the specified path.
-library = ctypes.cdll.LoadLibrary(library_path)
+# Load the shared library.  On POSIX systems RTLD_NOW resolves all of its symbols while loading, instead of lazily on
+# the first call of each function, so the first request doesn't pay for it.  Windows has no such flags and ignores the mode.
+if hasattr(os, 'RTLD_NOW'):
+    library = ctypes.CDLL(library_path, mode=os.RTLD_NOW | os.RTLD_LOCAL)
+else:
+    library = ctypes.CDLL(library_path)
 
-# Define the argument and return types for the 'request' function.
-# This is crucial for proper interaction with the C/C++ library.
-# argtypes specifies the expected argument types for the function.  Here it's a char pointer (string).
-# restype specifies the return type of the function.  Here it's also a char pointer (string).
+# All exposed functions share the same signature: they take a string (JSON payload) and return a string.
+# A single prototype is created once and used to bind every symbol, instead of setting argtypes/restype
+# on each attribute separately.
+# Callers must pass bytes, so ctypes hands the buffer over as-is without wrapping it in a new c_char_p.
+# Functions bound through CFUNCTYPE release the GIL for the duration of the call, so requests made from
+# several Python threads run concurrently inside the library (do not switch this to PYFUNCTYPE).
 # https://bogdanfinn.gitbook.io/open-source-oasis/shared-library/exposed-methods
-request = library.request
-request.argtypes = [ctypes.c_char_p] # Expects a string as input
-request.restype = ctypes.c_char_p  # Returns a string
-
-# Define the argument and return types for the 'getCookiesFromSession' function.
-# Similar to 'request', this function takes a string and returns a string.
-getCookiesFromSession = library.getCookiesFromSession
-getCookiesFromSession.argtypes = [ctypes.c_char_p] # Expects a string (session ID) as input
-getCookiesFromSession.restype = ctypes.c_char_p  # Returns a string (cookies)
-
-# Define the argument and return types for the 'addCookiesToSession' function.
-# This function takes a string (presumably cookies) and returns a string (possibly a status indicator).
-addCookiesToSession = library.addCookiesToSession
-addCookiesToSession.argtypes = [ctypes.c_char_p] # Expects a string (cookies) as input
-addCookiesToSession.restype = ctypes.c_char_p  # Returns a string
-
-# Define the argument and return types for the 'freeMemory' function.
-# This function presumably takes a pointer to memory allocated by the library and frees it.
-freeMemory = library.freeMemory
-freeMemory.argtypes = [ctypes.c_char_p] # Expects a char pointer (to be freed)
-freeMemory.restype = ctypes.c_char_p  # Returns a string (potentially a status/confirmation)
-
-# Define the argument and return types for the 'destroySession' function.
-# This function takes a string (presumably a session ID) and returns a string (likely a status indicator).
-destroySession = library.destroySession
-destroySession.argtypes = [ctypes.c_char_p] # Expects a string (session ID) as input
-destroySession.restype = ctypes.c_char_p  # Returns a string
-
-# Define the return type for the 'destroyAll' function.
-# This function takes no arguments and returns a string.
-destroyAll = library.destroyAll
-destroyAll.restype = ctypes.c_char_p  # Returns a string
\ No newline at end of file
+PROTOTYPE = ctypes.CFUNCTYPE(ctypes.c_char_p, ctypes.c_char_p)
+
+# Sends a request, takes the request payload and returns the response.
+request = PROTOTYPE(('request', library))
+
+# Takes a payload with the session ID and url and returns the cookies of the session.
+getCookiesFromSession = PROTOTYPE(('getCookiesFromSession', library))
+
+# Takes a payload with the session ID, url and cookies and returns a status.
+addCookiesToSession = PROTOTYPE(('addCookiesToSession', library))
+
+# Takes the ID of a response and frees the memory the library allocated for it.
+freeMemory = PROTOTYPE(('freeMemory', library))
+
+# Takes a payload with the session ID and returns a status.
+destroySession = PROTOTYPE(('destroySession', library))
+
+# Takes no arguments and returns a status.
+destroyAll = ctypes.CFUNCTYPE(ctypes.c_char_p)(('destroyAll', library))
+
+# Payloads and responses of the library are JSON, use orjson for them when it's installed.
+if orjson is not None:
+    def dumps(payload: Any) -> bytes:
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+
+    loads = orjson.loads
+else:
+    def dumps(payload: Any) -> bytes:
+        return json.dumps(payload).encode('utf-8')
+
+    loads = json.loads
+
+
+def call_json(function: Callable[[bytes], bytes], payload: Any) -> Any:
+    """Serialises the payload, calls the function of the library with it and parses the returned JSON.
+
+    The library keeps every response allocated until freeMemory is called with its ID. The response has already
+    been copied into Python memory by ctypes at this point, so it is freed right away.
+    """
+    response_object = loads(function(dumps(payload)))
+    freeMemory(response_object['id'].encode('utf-8'))
+    return response_object
+
+
+def request_json(payload: Any) -> Any:
+    """Sends a request with the given payload and returns the parsed response."""
+    return call_json(request, payload)
@@ -1,18 +1,17 @@
 import base64
-import ctypes
 import os
 import threading
 import time
 import urllib.parse
 import uuid
 from datetime import timedelta
-from json import dumps, loads
+from json import dumps
 from sys import platform
 from typing import Any, Dict, List, Optional, Tuple, Union
 from urllib.parse import urljoin
 
 from .__version__ import __version__
-from .cffi import addCookiesToSession, destroySession, freeMemory, getCookiesFromSession, request
+from .cffi import addCookiesToSession, call_json, destroySession, getCookiesFromSession, request_json
 from .cookies import cookiejar_from_dict, extract_cookies_to_jar, merge_cookies
 from .exceptions import TLSClientExeption
 from .response import Response, build_response
@@ -352,25 +351,17 @@ class Session:
             "sessionId": self._session_id
         }
 
-        destroy_session_response = destroySession(dumps(destroy_session_payload).encode('utf-8'))
-        destroy_session_response_bytes = ctypes.string_at(destroy_session_response)
-        destroy_session_response_string = destroy_session_response_bytes.decode('utf-8')
-        destroy_session_response_object = loads(destroy_session_response_string)
-        freeMemory(destroy_session_response_object['id'].encode('utf-8'))
+        destroy_session_response_object = call_json(destroySession, destroy_session_payload)
         # todo add exception if success is False
-        return destroy_session_response_string
+        return dumps(destroy_session_response_object)
 
     def get_cookies_from_session(self, url: str) -> List[Dict[str, str]]:
         cookie_payload = {
             "sessionId": self._session_id,
             "url": url,
         }
-        cookie_response = getCookiesFromSession(dumps(cookie_payload).encode('utf-8'))
-        cookie_response_bytes = ctypes.string_at(cookie_response)
-        cookie_response_string = cookie_response_bytes.decode('utf-8')
-        cookie_response_object = loads(cookie_response_string)
+        cookie_response_object = call_json(getCookiesFromSession, cookie_payload)
 
-        freeMemory(cookie_response_object['id'].encode('utf-8'))
         if cookie_response_object.get("status") == 0:
             raise TLSClientExeption(cookie_response_object["body"])
 
@@ -384,12 +375,8 @@ class Session:
             "url": url,
         }
         # todo add exception, no session
-        add_cookies_to_session_response = addCookiesToSession(dumps(cookies_payload).encode('utf-8'))
-        add_cookies_bytes = ctypes.string_at(add_cookies_to_session_response)
-        add_cookies_string = add_cookies_bytes.decode('utf-8')
-        add_cookies_object = loads(add_cookies_string)
+        add_cookies_object = call_json(addCookiesToSession, cookies_payload)
 
-        freeMemory(add_cookies_object['id'].encode('utf-8'))
         if add_cookies_object.get("status") == 0:
             raise TLSClientExeption(add_cookies_object["body"])
 
@@ -598,11 +585,7 @@ class Session:
             )
 
             # Execute the request using the TLS client
-            response = request(dumps(request_payload).encode('utf-8'))
-            response_bytes = ctypes.string_at(response)
-            response_string = response_bytes.decode('utf-8')
-            response_object = loads(response_string)
-            freeMemory(response_object['id'].encode('utf-8'))
+            response_object = request_json(request_payload)
 
             # todo update for each Response
             elapsed = preferred_clock() - start
@@ -1,112 +1,294 @@
 from __future__ import annotations  # Enable forward references for type hints.
 
+import errno  # Import the 'errno' module for recognising a lock attempt that timed out on Windows.
+import json  # Import the 'json' module for reading and writing the local version file.
 import os  # Import the 'os' module for interacting with the operating system.
+import shutil  # Import the 'shutil' module for copying the downloaded file stream to disk.
+import ssl  # Import the 'ssl' module for verifying certificates against the certifi bundle.
+import threading  # Import the 'threading' module for running the update check in the background.
+import time  # Import the 'time' module for comparing file modification times with the current time.
+import urllib.request  # Import the 'urllib.request' module for the HTTP requests to GitHub.
+import warnings  # Import the 'warnings' module for reporting failed background update checks.
+from contextlib import contextmanager  # Import the 'contextmanager' decorator for the update lock.
 from datetime import datetime, timedelta, timezone  # Import specific classes from the 'datetime' module for working with dates and times.
-from typing import Any, Dict, Optional  # Import type hinting utilities for better code readability and maintainability.
-
-import requests  # Import the 'requests' library for making HTTP requests.
+from typing import Any, Dict, Iterator, Optional, Tuple  # Import type hinting utilities for better code readability and maintainability.
+from urllib.error import HTTPError  # Import the exception raised by urllib for HTTP error status codes, including 304.
 
 from .utils import get_dependency_filename  # Import a function from the local 'utils' module, likely used to determine the filename of a dependency.
 
+if os.name == "nt":
+    import msvcrt  # Used to lock the update lock file on Windows.
+else:
+    import fcntl  # Used to lock the update lock file on POSIX systems.
+
 GITHUB_API_URL = "https://api.github.com/repos/bogdanfinn/tls-client/releases/latest"  # Define the URL for the GitHub API endpoint to fetch the latest release information.
 LOCAL_VERSION_FILE = os.path.join(os.path.dirname(__file__), "dependencies/version.txt")  # Construct the path to a local file where the currently installed version is stored.
 DOWNLOAD_DIR = os.path.dirname(LOCAL_VERSION_FILE)  # Determine the directory where dependencies are downloaded, based on the location of the version file.
+LOCK_FILE = LOCAL_VERSION_FILE + ".lock"  # Construct the path of the file locked while an update is running.
 CHECK_INTERVAL = timedelta(hours=24)  # Define the interval after which to check for updates (24 hours in this case).
+DOWNLOAD_CHUNK_SIZE = 64 * 1024  # Define the chunk size used when writing a downloaded file to disk (64 KiB).
+REQUEST_TIMEOUT = 10  # Define the timeout in seconds for the HTTP requests to GitHub.
+UPDATE_IN_BACKGROUND = os.name != "nt"  # Windows can't replace a loaded DLL, so there the update has to finish before the library is loaded.
 
 CURRENT_DEPENDENCY_FILENAME = get_dependency_filename()  # Get the filename of the current dependency using the imported utility function.
+LOCAL_LIBRARY_FILE = os.path.join(DOWNLOAD_DIR, CURRENT_DEPENDENCY_FILENAME)  # Construct the path of the installed dependency library.
+
+_LOCAL_VERSION_CACHE: Optional[Tuple[int, Optional[Dict[str, str]]]] = None  # The memoized version file content, with the file's modification time.
+_OPENER: Optional[urllib.request.OpenerDirector] = None  # The opener shared by all update checks of this process, created on first use.
+
+
+def get_opener() -> urllib.request.OpenerDirector:
+    """Returns the opener used for update checks, creating it on first use.
 
+    urllib opens a new connection for every request, the opener is only shared to set up its handlers once.
+    """
+    global _OPENER
+    if _OPENER is None:
+        try:
+            import certifi  # Optional, python.org builds on macOS don't use the system trust store until certificates are installed.
+        except ImportError:
+            _OPENER = urllib.request.build_opener()  # Create a new opener verifying certificates against the system trust store.
+        else:
+            ssl_context = ssl.create_default_context(cafile=certifi.where())  # Verify certificates against the certifi bundle, like requests does.
+            _OPENER = urllib.request.build_opener(urllib.request.HTTPSHandler(context=ssl_context))
+        _OPENER.addheaders = [("User-Agent", "tls-client-updater")]  # Identify the updater to the GitHub API.
+    return _OPENER
 
-def get_latest_release(session: requests.Session) -> tuple[Any, str | None] | None:
+
+def get_latest_release(opener: urllib.request.OpenerDirector, local_version_info: Optional[Dict[str, str]]) -> tuple[Any, str | None, str | None] | None:
     """Fetches the latest release information from GitHub, using conditional requests if possible."""
     headers = {}  # Initialize an empty dictionary for request headers.
-    local_version_info = read_local_version()  # Read the locally stored version information.
-    if local_version_info and 'Etag' in local_version_info:
-        headers['If-None-Match'] = local_version_info['Etag']  # If an ETag is available locally, add it to the headers for conditional request.
+    if local_version_info and local_version_info.get('etag'):
+        headers['If-None-Match'] = local_version_info['etag']  # If an ETag is available locally, add it to the headers for conditional request.
+    if local_version_info and local_version_info.get('last_modified'):
+        headers['If-Modified-Since'] = local_version_info['last_modified']  # Also send the Last-Modified date, in case the ETag gets dropped along the way.
 
-    response = session.get(GITHUB_API_URL, headers=headers)  # Make a GET request to the GitHub API.
+    request = urllib.request.Request(GITHUB_API_URL, headers=headers)  # Build a GET request to the GitHub API.
+    try:
+        with opener.open(request, timeout=REQUEST_TIMEOUT) as response:  # Send the request, urllib raises HTTPError for bad status codes (4xx or 5xx).
+            latest_release = json.loads(response.read())  # Parse the JSON response from the GitHub API.
+            return latest_release, response.headers.get('Last-Modified'), response.headers.get('ETag')  # Return the release data and the caching headers of the response.
+    except HTTPError as e:
+        if e.code == 304:  # Not Modified
+            return None  # If the server returns 304, it means there's no new release.
+        raise
 
-    if response.status_code == 304:  # Not Modified
-        return None  # If the server returns 304, it means there's no new release.
 
-    response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx).
-    latest_release = response.json()  # Parse the JSON response from the GitHub API.
-    return latest_release, response.headers.get('Etag')  # Return the release data and the ETag from the response headers.
+def read_local_version() -> Optional[Dict[str, str]]:
+    """Reads the local version information from the version file, memoized until the file changes."""
+    global _LOCAL_VERSION_CACHE
+    try:
+        mtime = os.stat(LOCAL_VERSION_FILE).st_mtime_ns  # Get the modification time of the local version file.
+    except OSError:
+        return None  # Return None if the file doesn't exist.
+    if _LOCAL_VERSION_CACHE is not None and _LOCAL_VERSION_CACHE[0] == mtime:
+        return _LOCAL_VERSION_CACHE[1]  # The file hasn't changed since it was last read, return the memoized content.
 
+    with open(LOCAL_VERSION_FILE, "r") as f:  # Open the file in read mode.
+        content = f.read()  # Read the whole file at once.
+    if content.startswith("{"):
+        local_version_info = parse_version_json(content)  # The file is stored as a JSON object.
+    else:
+        local_version_info = parse_legacy_version(content)  # The file is still in the old line based format, it's rewritten as JSON on the next save.
+    _LOCAL_VERSION_CACHE = (mtime, local_version_info)  # Memoize the content together with the modification time it was read at.
+    return local_version_info
 
-def read_local_version() -> Optional[Dict[str, str]]:
-    """Reads the local version information from the version file."""
-    if os.path.exists(LOCAL_VERSION_FILE):  # Check if the local version file exists.
-        with open(LOCAL_VERSION_FILE, "r") as f:  # Open the file in read mode.
-            lines = f.read().splitlines(False)  # Read the lines from the file, discarding trailing newline characters.
-            if len(lines) >= 3:  # Check if the file contains at least 3 lines (version, last_modified, last_check).
-                return {
-                    'version': lines[0],  # The first line is the version.
-                    'last_modified': lines[1],  # The second line is the last modified date/time.
-                    'last_check': lines[2]  # The third line is the last check date/time.
-                }
-    return None  # Return None if the file doesn't exist or doesn't have the expected content.
-
-
-def save_local_version(version: str, last_modified: str) -> None:
+
+def parse_version_json(content: str) -> Optional[Dict[str, str]]:
+    """Parses the content of a version file stored as a JSON object."""
+    try:
+        data = json.loads(content)  # Parse the JSON object.
+    except ValueError:
+        return None  # Return None if the file is corrupted.
+    if not isinstance(data, dict) or 'version' not in data or 'last_check' not in data:
+        return None  # Return None if the file doesn't have the expected content.
+    return {
+        'version': data['version'],  # The installed version.
+        'last_modified': data.get('last_modified') or '',  # The Last-Modified date of the release response.
+        'last_check': data['last_check'],  # The last check date/time.
+        'etag': data.get('etag') or ''  # The ETag of the release response.
+    }
+
+
+def parse_legacy_version(content: str) -> Optional[Dict[str, str]]:
+    """Parses the content of a version file stored in the old line based format."""
+    parts = [part.rstrip("\r") for part in content.split("\n", 4)[:4]]  # Split off only the four known fields, dropping the rest of the file and any '\r' line endings.
+    if len(parts) < 3:  # Check if the file contains at least 3 lines (version, last_modified, last_check).
+        return None  # Return None if the file doesn't have the expected content.
+    return {
+        'version': parts[0],  # The first line is the version.
+        'last_modified': parts[1],  # The second line is the last modified date/time.
+        'last_check': parts[2],  # The third line is the last check date/time.
+        'etag': parts[3] if len(parts) > 3 else ''  # The optional fourth line is the ETag of the release response.
+    }
+
+
+def save_local_version(version: str, last_modified: str | None, etag: str | None) -> None:
     """Saves the latest version information to the local version file."""
+    global _LOCAL_VERSION_CACHE
+    _LOCAL_VERSION_CACHE = None  # Invalidate the memoized content of the file.
     now = datetime.now(timezone.utc).isoformat()  # Get the current UTC time in ISO format.
-    with open(LOCAL_VERSION_FILE, "w") as f:  # Open the file in write mode, overwriting existing content.
-        f.write(f"{version}\n{last_modified}\n{now}")  # Write the new version, last modified date, and current time to the file.
+    local_version_info = {
+        'version': version,  # The new version.
+        'last_modified': last_modified or '',  # The Last-Modified date of the release response.
+        'last_check': now,  # The current time as the last check date/time.
+        'etag': etag or ''  # The ETag of the release response.
+    }
+    temp_file = LOCAL_VERSION_FILE + ".tmp"  # Write to a temporary file first, so a crash can't leave the version file truncated.
+    with open(temp_file, "w") as f:  # Open the temporary file in write mode.
+        json.dump(local_version_info, f)  # Write the version information as a JSON object.
+    os.replace(temp_file, LOCAL_VERSION_FILE)  # Atomically replace the version file with the complete one.
 
 
-def download_file(session: requests.Session, url: str, dest_path: str) -> None:
+def download_file(opener: urllib.request.OpenerDirector, url: str, dest_path: str) -> None:
     """Downloads a file from the given URL to the specified destination path."""
-    response = session.get(url)  # Make a GET request to the file URL.
-    response.raise_for_status()  # Raise an exception for bad status codes.
-    with open(dest_path, "wb") as f:  # Open the destination file in binary write mode.
-        f.write(response.content)  # Write the content of the response to the file.
+    with opener.open(url, timeout=REQUEST_TIMEOUT) as response:  # Make a GET request, urllib raises HTTPError for bad status codes.
+        temp_path = dest_path + ".tmp"  # Download to a temporary file, the destination may be loaded by a running process.
+        with open(temp_path, "wb") as f:  # Open the temporary file in binary write mode.
+            shutil.copyfileobj(response, f, length=DOWNLOAD_CHUNK_SIZE)  # Copy the body to the file chunk by chunk, so it isn't buffered in memory.
+    try:
+        # Atomically replace the destination. On POSIX processes that loaded the old file keep using it, Windows refuses to replace a loaded DLL.
+        os.replace(temp_path, dest_path)
+    except OSError:
+        os.remove(temp_path)  # Don't leave the downloaded file behind.
+        raise
+
 
+def find_asset(latest_release: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Finds the release asset of the dependency for the current platform."""
+    dependency, extension = CURRENT_DEPENDENCY_FILENAME.rsplit(".", 1)  # Split the dependency file name into base name and extension.
+    assets_by_name = {asset["name"]: asset for asset in latest_release["assets"]}  # Index the release assets by their file name.
 
-def should_check_update() -> bool:
+    # Assets are named like "<base name>-<version>.<extension>", e.g. "tls-client-linux-arm64-1.7.10.so" for tag "v1.7.10".
+    asset = assets_by_name.get(f"{dependency}-{latest_release['tag_name'].lstrip('v')}.{extension}")
+    if asset is not None:
+        return asset
+
+    # Fall back to any asset with the right base name and extension, never matching e.g. the ".h" header of the same build.
+    return next(
+        (asset for name, asset in assets_by_name.items() if name.startswith(f"{dependency}-") and name.endswith(f".{extension}")),
+        None
+    )
+
+
+def should_check_update(local_version_info: Optional[Dict[str, str]]) -> bool:
     """Determines if an update check should be performed based on the last check time."""
-    local_version_info = read_local_version()  # Read the local version information.
+    try:
+        library_mtime = os.stat(LOCAL_LIBRARY_FILE).st_mtime  # Get the time the library was last written.
+    except OSError:
+        library_mtime = None  # The library isn't installed yet.
+    if library_mtime is not None and time.time() - library_mtime < CHECK_INTERVAL.total_seconds():
+        return False  # A library written within the interval is fresh, even if there is no version file (e.g. pre-installed).
+
     if not local_version_info or 'last_check' not in local_version_info:
         return True  # If no local version info or last check time is available, perform a check.
     last_check = datetime.fromisoformat(local_version_info['last_check'])  # Parse the last check time from the local info.
     return datetime.now(timezone.utc) - last_check > CHECK_INTERVAL  # Return True if the time since the last check exceeds the defined interval.
 
 
+@contextmanager
+def update_lock() -> Iterator[None]:
+    """Holds an exclusive lock on the lock file, so only one process at a time updates the dependency."""
+    os.makedirs(DOWNLOAD_DIR, exist_ok=True)  # Ensure the download directory exists.
+    fd = os.open(LOCK_FILE, os.O_RDWR | os.O_CREAT)  # Open the lock file, creating it if needed.
+    try:
+        if os.name == "nt":
+            while True:
+                try:
+                    msvcrt.locking(fd, msvcrt.LK_LOCK, 1)  # Lock the first byte of the file, waiting for other processes.
+                    break
+                except OSError as e:
+                    if e.errno != errno.EDEADLOCK:
+                        raise
+                    # LK_LOCK gives up after 10 attempts one second apart, keep waiting for a download that takes longer.
+        else:
+            fcntl.flock(fd, fcntl.LOCK_EX)  # Lock the file, waiting for other processes.
+        try:
+            yield
+        finally:
+            if os.name == "nt":
+                os.lseek(fd, 0, os.SEEK_SET)  # Unlocking has to start at the same position as the lock.
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)  # Unlock the first byte of the file.
+            else:
+                fcntl.flock(fd, fcntl.LOCK_UN)  # Unlock the file.
+    finally:
+        os.close(fd)  # Close the lock file.
+
+
 def update_lib() -> None:
     """Checks for updates and downloads the latest version of the dependency if available."""
-    if not should_check_update():
+    if os.path.exists(LOCAL_LIBRARY_FILE) and not should_check_update(read_local_version()):
         return  # If it's not time to check for an update, exit the function.
 
-    session = requests.Session()  # Create a new requests session.
+    with update_lock():
+        if not os.path.exists(LOCAL_LIBRARY_FILE):
+            # The library is missing, install the latest release without a conditional request or a version comparison,
+            # as the version file may still describe a library that was deleted.
+            install_latest_release(None)
+            return
+
+        local_version_info = read_local_version()  # Read the local version information again, another process may have just updated it.
+        if not should_check_update(local_version_info):
+            return  # If another process already did the check, exit the function.
+        install_latest_release(local_version_info)  # Check for a new release and install it.
 
-    os.makedirs(DOWNLOAD_DIR, exist_ok=True)  # Ensure the download directory exists.
 
-    result = get_latest_release(session)  # Fetch the latest release information from GitHub.
+def update_lib_async() -> None:
+    """Runs update_lib in a background thread, so importing tls_client doesn't wait for GitHub.
+
+    On Windows the update runs before returning instead, as the library can't be replaced once it's loaded.
+    """
+    if not os.path.exists(LOCAL_LIBRARY_FILE):
+        update_lib()  # The library is needed right away to load it, so it has to be downloaded before returning.
+        return
+
+    if not should_check_update(read_local_version()):
+        return  # If it's not time to check for an update, don't bother starting a thread.
+
+    if not UPDATE_IN_BACKGROUND:
+        try_update_lib()  # Check for updates now, the library is loaded right after this returns.
+        return
+
+    threading.Thread(target=try_update_lib, daemon=True).start()  # Check for updates in the background.
+
+
+def try_update_lib() -> None:
+    """Runs update_lib, reporting a failed check (e.g. while offline) as a single warning instead of a traceback."""
+    try:
+        update_lib()
+    except Exception as e:  # The installed library still works, so any error (e.g. a truncated download or an unexpected release payload) ends here.
+        warnings.warn(f"Could not check for a new version of {CURRENT_DEPENDENCY_FILENAME}: {e!r}", RuntimeWarning)
+
+
+def install_latest_release(local_version_info: Optional[Dict[str, str]]) -> None:
+    """Fetches the latest release information from GitHub and downloads the dependency if there is a new version."""
+    opener = get_opener()  # Get the shared opener.
+
+    result = get_latest_release(opener, local_version_info)  # Fetch the latest release information from GitHub.
     if result is None:
-        return  # If no new release is available, exit the function.
+        # No new release is available, only refresh the last check time so the next check waits a full interval.
+        save_local_version(local_version_info['version'], local_version_info['last_modified'], local_version_info['etag'])
+        return
 
-    latest_release, last_modified = result  # Unpack the result.
+    latest_release, last_modified, etag = result  # Unpack the result.
     latest_version = latest_release["tag_name"]  # Extract the tag name as the latest version.
-    local_version_info = read_local_version()  # Read the local version information.
 
     if local_version_info and latest_version == local_version_info['version']:
+        save_local_version(latest_version, last_modified, etag)  # Refresh the caching headers and the last check time.
         return  # If the latest version is the same as the local version, no update is needed.
 
     print(f"New version found: {latest_version}. Updating...")  # Notify the user about the new version.
 
-    assets = latest_release["assets"]  # Get the list of assets for the latest release.
-    dependency = CURRENT_DEPENDENCY_FILENAME.rsplit(".", 1)[0]  # Extract the base name of the dependency file.
-    for asset in assets:  # Iterate through the assets.
-        if asset["name"].startswith(dependency):  # Check if the asset name starts with the dependency base name.
-            download_url = asset["browser_download_url"]  # Get the download URL of the asset.
-            dest_path = os.path.join(DOWNLOAD_DIR, CURRENT_DEPENDENCY_FILENAME)  # Construct the destination path for the downloaded file.
-            download_file(session, download_url, dest_path)  # Download the file.
-            print(f"Downloaded {CURRENT_DEPENDENCY_FILENAME} from {download_url}")  # Notify the user about the download.
-            break  # Exit the loop after downloading the correct asset.
-    else:
+    asset = find_asset(latest_release)  # Look up the asset matching the current platform.
+    if asset is None:
         print(f"Could not find asset for {CURRENT_DEPENDENCY_FILENAME}")  # Notify the user if the correct asset was not found.
         return
 
-    save_local_version(latest_version, last_modified)  # Save the new version information locally.
+    download_url = asset["browser_download_url"]  # Get the download URL of the asset.
+    download_file(opener, download_url, LOCAL_LIBRARY_FILE)  # Download the file.
+    print(f"Downloaded {CURRENT_DEPENDENCY_FILENAME} from {download_url}")  # Notify the user about the download.
+
+    save_local_version(latest_version, last_modified, etag)  # Save the new version information locally.
     print(f"Updated to version {latest_version}")  # Notify the user about the successful update.
 
 
@@ -1,4 +1,5 @@
 import ctypes
+import functools
 import platform
 from typing import Tuple
 
@@ -33,6 +34,7 @@ def get_system_info() -> Tuple[str, str]:
             return 'linux', 'alpine-amd64'  # Default to Alpine for unknown architectures
 
 
+@functools.lru_cache(maxsize=1)
 def get_dependency_filename():
     system, arch = get_system_info()
     return dependency_filenames.get((system, arch))